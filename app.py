@@ -1,25 +1,49 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# gevent monkey-patching превращает блокирующие socket/ssl вызовы в кооперативные
+# гринлеты — должен выполняться до импорта остальных модулей
+from gevent import monkey
+monkey.patch_all()
+
 import os
 import json
 import logging
 import hashlib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify, send_from_directory, abort, make_response
+from flask_caching import Cache
 from google_play_scraper import app as play_scraper, search
 from PIL import Image
-from colorthief import ColorThief
+# C++ MMCQ; при отсутствии колеса используется C-квантователь Pillow
+try:
+    import fast_colorthief
+except ImportError:
+    fast_colorthief = None
+import numpy as np
 import io
 from datetime import datetime
-from jinja2 import Template
+from jinja2 import Environment, DictLoader, FileSystemBytecodeCache
 import re
 import random
+import secrets
+import time
+import gzip
+import html
 import zipfile
 from urllib.parse import urlparse
 import colorsys
 import shutil
-import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# C-парсер HTML (lexbor) — быстрее и корректнее регулярки на описаниях из Play
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
 
 # Настройка логирования
 logging.basicConfig(
@@ -31,6 +55,25 @@ logger = logging.getLogger(__name__)
 # Создаем Flask приложение
 app = Flask(__name__)
 
+# JSON через Rust-сериализатор orjson: быстрее stdlib и для jsonify, и для get_json
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+
+    class OrjsonProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
+except ImportError:
+    pass
+
+# X-Sendfile: байты статики отдаёт фронтовый nginx через zero-copy sendfile(2)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
 # Конфигурация
 BASE_URL = os.environ.get('BASE_URL', 'https://vibe.clickapi.org')
 STATIC_DIR = os.environ.get('STATIC_DIR', '/app/static')
@@ -50,6 +93,92 @@ for directory in [LANDINGS_DIR, IMAGES_DIR, ARCHIVES_DIR, LEGAL_DIR]:
 logger.info(f"Starting with BASE_URL: {BASE_URL}")
 logger.info(f"Static directory: {STATIC_DIR}")
 
+# Пул потоков для параллельного скачивания изображений (I/O-bound)
+DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='img-dl')
+
+# Общая HTTP-сессия: keep-alive к CDN вместо нового TLS-рукопожатия на каждую картинку
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+})
+
+# Отсечка размера скачиваемой картинки — защита от гигантских/бесконечных тел
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Предкомпилированные регулярные выражения горячего пути
+_SIZE_CLEAN_RE = re.compile(r'[^\d.]')
+_YT_ID_RE = re.compile(r'(?:v=|/)([0-9A-Za-z_-]{11})')
+# <[^>]*> линеен и не бэктрекает на патологическом вводе, в отличие от <.*?>
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+# Валидное имя Android-пакета — отсекаем мусор до похода в Google Play
+_PKG_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*(?:\.[a-zA-Z][a-zA-Z0-9_]*)+$')
+
+# Кэш результатов Google Play: Redis при наличии CACHE_REDIS_URL, иначе в памяти процесса.
+# Префикс ключа содержит версию схемы — при обновлении скрейпера старые записи инвалидируются.
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+if CACHE_REDIS_URL:
+    cache = Cache(app, config={
+        'CACHE_TYPE': 'RedisCache',
+        'CACHE_REDIS_URL': CACHE_REDIS_URL,
+        'CACHE_DEFAULT_TIMEOUT': 3600,
+        'CACHE_KEY_PREFIX': 'vibe:v1:'
+    })
+    logger.info(f"Using Redis cache: {CACHE_REDIS_URL}")
+else:
+    # Дисковый кэш: переживает рестарты воркеров и общий для всех процессов gunicorn
+    cache = Cache(app, config={
+        'CACHE_TYPE': 'FileSystemCache',
+        'CACHE_DIR': os.path.join(STATIC_DIR, '.cache'),
+        'CACHE_DEFAULT_TIMEOUT': 3600,
+        'CACHE_THRESHOLD': 2000
+    })
+    logger.info("CACHE_REDIS_URL not set, using on-disk FileSystemCache")
+
+@cache.memoize(timeout=3600)
+def cached_play_app(package_name, language):
+    """Кэшированный запрос данных приложения из Google Play.
+
+    Скрейпер периодически ловит 429/5xx под нагрузкой — до трёх попыток
+    с экспоненциальной задержкой и джиттером, чтобы разовый сбой не
+    превращался в 500 клиенту."""
+    last_error = None
+    for attempt in range(3):
+        try:
+            return play_scraper(package_name, lang=language, country='us')
+        except Exception as e:
+            last_error = e
+            if attempt < 2:
+                delay = (2 ** attempt) + random.random() * 0.5
+                logger.warning(
+                    f"play_scraper failed for {package_name} "
+                    f"(attempt {attempt + 1}/3): {e}; retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+    raise last_error
+
+@cache.memoize(timeout=3600)
+def cached_play_search(query, n_hits):
+    """Кэшированный поиск приложений в Google Play"""
+    return search(query, n_hits=n_hits)
+
+def strip_html(html_text):
+    """Очистка HTML-тегов из описания приложения"""
+    if not html_text:
+        return ''
+    if HTMLParser is not None:
+        try:
+            return HTMLParser(html_text).text(separator=' ', strip=True)
+        except Exception as e:
+            logger.error(f"selectolax failed to parse description: {e}")
+    return _HTML_TAG_RE.sub('', html_text)
+
 def format_installs(installs):
     """Форматирование числа установок в человекочитаемый вид"""
     try:
@@ -73,7 +202,7 @@ def format_size(size_bytes):
         # Преобразуем строку в число если нужно
         if isinstance(size_bytes, str):
             # Удаляем все нецифровые символы кроме точки
-            size_bytes = re.sub(r'[^\d.]', '', size_bytes)
+            size_bytes = _SIZE_CLEAN_RE.sub('', size_bytes)
             if not size_bytes:
                 return "Varies"
             size_bytes = float(size_bytes)
@@ -95,7 +224,7 @@ def get_youtube_embed_url(video_url):
         if not video_url:
             return None
         
-        video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11})', video_url)
+        video_id_match = _YT_ID_RE.search(video_url)
         if video_id_match:
             video_id = video_id_match.group(1)
             return f"https://www.youtube.com/embed/{video_id}"
@@ -104,35 +233,116 @@ def get_youtube_embed_url(video_url):
         logger.error(f"Error converting YouTube URL: {e}")
         return None
 
+# blake3 (SIMD) опционален: на коротких URL разница мала, но если хэш
+# когда-нибудь пойдёт по байтам изображений — прирост в разы
+try:
+    from blake3 import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
+def short_hash(data):
+    """Быстрый некриптографический хэш для ключей кэша и имён файлов"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if _blake3 is not None:
+        return _blake3(data).hexdigest(length=8)
+    return hashlib.blake2b(data, digest_size=8, usedforsecurity=False).hexdigest()
+
+def image_cache_path(url):
+    """Путь изображения в адресуемом по хэшу URL хранилище"""
+    digest = short_hash(url)
+    return os.path.join(IMAGES_DIR, 'by-hash', digest[:2], digest)
+
 def download_image(url, save_path):
-    """Скачивание и сохранение изображения"""
+    """Скачивание изображения через общее хэш-хранилище: один URL скачивается
+    и хранится один раз, пакеты и лендинги ссылаются на общий файл"""
     try:
         if os.path.exists(save_path):
             logger.info(f"Image already cached: {save_path}")
             return True
-        
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        response.raise_for_status()
-        
+
+        cas_path = image_cache_path(url)
+        if not os.path.exists(cas_path):
+            os.makedirs(os.path.dirname(cas_path), exist_ok=True)
+            tmp_path = cas_path + '.part'
+            try:
+                with SESSION.get(url, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+
+                    response.raw.decode_content = True
+                    written = 0
+                    with open(tmp_path, 'wb') as f:
+                        while True:
+                            chunk = response.raw.read(1 << 16)
+                            if not chunk:
+                                break
+                            written += len(chunk)
+                            if written > MAX_IMAGE_BYTES:
+                                raise ValueError(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+                            f.write(chunk)
+
+                os.replace(tmp_path, cas_path)
+            finally:
+                # Недокачанный файл не должен выглядеть как закэшированный
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            logger.info(f"Downloaded image: {url} -> {cas_path}")
+
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        
-        logger.info(f"Downloaded image: {url} -> {save_path}")
-        return True
+        return link_image(cas_path, save_path)
     except Exception as e:
         logger.error(f"Failed to download image {url}: {str(e)}")
         return False
 
+def _fast_copy(src, dst):
+    """Копирование внутри ядра через copy_file_range — без буферов в user-space"""
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except (AttributeError, OSError):
+        # Не Linux или ФС без поддержки — copyfile использует sendfile внутри
+        shutil.copyfile(src, dst)
+
+def link_image(src, dst):
+    """Жёсткая ссылка на изображение вместо копирования — ноль лишних байтов на диске"""
+    try:
+        if os.path.exists(dst):
+            return True
+        try:
+            os.link(src, dst)
+        except OSError:
+            # Другая файловая система или нет поддержки ссылок — копируем
+            _fast_copy(src, dst)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to link image {src} -> {dst}: {e}")
+        return False
+
+def atomic_write(path, data):
+    """Атомарная запись: tempfile + rename, конкурентные читатели не видят
+    частично записанный файл"""
+    tmp_path = path + '.tmp'
+    # 64KB буфер — типичный HTML лендинга уходит на диск одним write
+    if isinstance(data, bytes):
+        with open(tmp_path, 'wb', buffering=1 << 16) as f:
+            f.write(data)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+
 def vary_color(hex_color, variation=0.15):
     """Варьирование цвета для создания уникальности"""
     try:
-        hex_color = hex_color.lstrip('#')
-        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        
+        # Один C-вызов bytes.fromhex вместо трёх int(..., 16)
+        r, g, b = bytes.fromhex(hex_color.lstrip('#'))
+
         h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
         
         h = (h + random.uniform(-variation, variation)) % 1
@@ -141,30 +351,106 @@ def vary_color(hex_color, variation=0.15):
         
         r, g, b = colorsys.hsv_to_rgb(h, s, v)
         
-        return '#{:02x}{:02x}{:02x}'.format(int(r*255), int(g*255), int(b*255))
+        return '#' + bytes((int(r*255), int(g*255), int(b*255))).hex()
     except Exception as e:
         logger.error(f"Error varying color: {e}")
         return hex_color
 
-def extract_dominant_colors(image_path, num_colors=3):
-    """Извлечение доминирующих цветов из изображения"""
+def vary_palette(palette, variation=0.1):
+    """Векторизованное варьирование всей палитры: один проход NumPy вместо
+    per-color вызовов colorsys"""
     try:
-        color_thief = ColorThief(image_path)
-        palette = color_thief.get_palette(color_count=num_colors, quality=1)
-        
-        colors = []
-        for rgb in palette[:num_colors]:
-            hex_color = '#{:02x}{:02x}{:02x}'.format(rgb[0], rgb[1], rgb[2])
-            colors.append(vary_color(hex_color, 0.1))
-        
-        default_colors = ['#4285f4', '#34a853', '#fbbc04']
-        while len(colors) < 3:
-            colors.append(vary_color(random.choice(default_colors)))
-        
+        arr = np.asarray(palette, dtype=np.float32) / 255.0
+        r, g, b = arr[:, 0], arr[:, 1], arr[:, 2]
+
+        # RGB -> HSV
+        maxc = arr.max(axis=1)
+        minc = arr.min(axis=1)
+        delta = maxc - minc
+        safe_delta = np.where(delta == 0, 1, delta)
+        s = np.where(maxc > 0, delta / np.where(maxc == 0, 1, maxc), 0)
+        v = maxc
+        h = np.where(maxc == r, (g - b) / safe_delta,
+                     np.where(maxc == g, 2.0 + (b - r) / safe_delta,
+                              4.0 + (r - g) / safe_delta))
+        h = np.where(delta == 0, 0, (h / 6.0) % 1.0)
+
+        # Джиттер всей палитры одним набором случайных векторов
+        n = len(arr)
+        h = (h + np.random.uniform(-variation, variation, n)) % 1.0
+        s = np.clip(s + np.random.uniform(-variation / 2, variation / 2, n), 0, 1)
+        v = np.clip(v + np.random.uniform(-variation / 2, variation / 2, n), 0.3, 1)
+
+        # HSV -> RGB
+        i = (h * 6.0).astype(np.int32) % 6
+        f = h * 6.0 - np.floor(h * 6.0)
+        p = v * (1 - s)
+        q = v * (1 - s * f)
+        t = v * (1 - s * (1 - f))
+        sextants = np.stack([
+            np.stack([v, t, p], axis=1),
+            np.stack([q, v, p], axis=1),
+            np.stack([p, v, t], axis=1),
+            np.stack([p, q, v], axis=1),
+            np.stack([t, p, v], axis=1),
+            np.stack([v, p, q], axis=1)
+        ])
+        rgb = (sextants[i, np.arange(n)] * 255).astype(np.uint8)
+
+        return ['#{:02x}{:02x}{:02x}'.format(*c) for c in rgb]
+    except Exception as e:
+        logger.error(f"Error varying palette: {e}")
+        return [vary_color('#{:02x}{:02x}{:02x}'.format(c[0], c[1], c[2]), variation)
+                for c in palette]
+
+# Фирменные цвета Google по умолчанию: #4285f4, #34a853, #fbbc04
+_DEFAULT_PALETTE = ((66, 133, 244), (52, 168, 83), (251, 188, 4))
+
+def _extract_palette(image_path, num_colors):
+    """Сырая палитра изображения (до варьирования)"""
+    # Декодируем один раз через PIL и отдаём RGBA-массив напрямую в C++ MMCQ.
+    # Палитре не нужно полное разрешение: 96x96 даёт те же доминирующие
+    # цвета, а объём работы квантователя падает квадратично
+    with Image.open(image_path) as img:
+        # Для JPEG draft снижает разрешение ещё на этапе IDCT — декодер
+        # отдаёт уменьшенную картинку вместо полной; для PNG это no-op
+        img.draft('RGB', (96, 96))
+        img.thumbnail((96, 96), Image.Resampling.BOX)
+        if fast_colorthief is not None:
+            rgba = np.asarray(img.convert('RGBA'))
+            return fast_colorthief.get_palette(rgba, color_count=num_colors, quality=1)
+        # FASTOCTREE живёт в libImaging — пиксельный цикл остаётся в C
+        quantized = img.convert('RGB').quantize(colors=num_colors, method=Image.Quantize.FASTOCTREE)
+        raw_palette = quantized.getpalette()[:num_colors * 3]
+        return [tuple(raw_palette[i:i + 3]) for i in range(0, len(raw_palette), 3)]
+
+def extract_dominant_colors(image_path, num_colors=3, source_url=None):
+    """Извлечение доминирующих цветов из изображения.
+
+    Сырая палитра — чистая функция от картинки, поэтому при известном
+    source_url кэшируется: повторные генерации (та же иконка для всех
+    локалей) пропускают декодирование и квантование. Варьирование
+    остаётся по-лендинговым."""
+    try:
+        palette = None
+        palette_key = f"palette:{short_hash(source_url)}" if source_url else None
+        if palette_key:
+            palette = cache.get(palette_key)
+
+        if palette is None:
+            palette = _extract_palette(image_path, num_colors)
+            if palette_key:
+                cache.set(palette_key, palette, timeout=7 * 86400)
+
+        colors = vary_palette(palette[:num_colors], 0.1)
+
+        if len(colors) < 3:
+            colors.extend(vary_palette(_DEFAULT_PALETTE, 0.15)[:3 - len(colors)])
+
         return colors
     except Exception as e:
         logger.error(f"Failed to extract colors: {str(e)}")
-        return [vary_color(c) for c in ['#4285f4', '#34a853', '#fbbc04']]
+        return vary_palette(_DEFAULT_PALETTE, 0.15)
 
 def get_similar_apps(package_name, developer, category, max_apps=8):
     """Получение похожих приложений"""
@@ -174,7 +460,7 @@ def get_similar_apps(package_name, developer, category, max_apps=8):
         # Пробуем найти приложения того же разработчика
         if developer:
             try:
-                dev_results = search(developer, n_hits=5)
+                dev_results = cached_play_search(developer, n_hits=5)
                 for app in dev_results:
                     if app.get('appId') != package_name:
                         similar_apps.append({
@@ -191,7 +477,7 @@ def get_similar_apps(package_name, developer, category, max_apps=8):
             try:
                 # Извлекаем ключевые слова из категории
                 category_keywords = category.split('_')[-1] if '_' in category else category
-                cat_results = search(category_keywords, n_hits=10)
+                cat_results = cached_play_search(category_keywords, n_hits=10)
                 for app in cat_results:
                     if app.get('appId') != package_name and not any(s['package_name'] == app.get('appId') for s in similar_apps):
                         similar_apps.append({
@@ -212,37 +498,95 @@ def get_similar_apps(package_name, developer, category, max_apps=8):
 
 def generate_landing_id(package_name, language):
     """Генерация уникального ID для лендинга"""
-    content = f"{package_name}_{language}_{datetime.now().isoformat()}_{random.randint(1000, 9999)}"
-    return hashlib.md5(content.encode()).hexdigest()[:12]
+    # 12 hex-символов случайности напрямую — без datetime/MD5-обвязки
+    return secrets.token_hex(6)
+
+# Пулы вариантов дизайна: индексируются батчем случайных чисел вместо
+# двух десятков отдельных вызовов random.*
+_LAYOUT_STYLES = ('classic', 'modern', 'minimal', 'bold', 'elegant')
+_HERO_LAYOUTS = ('left-aligned', 'center-aligned', 'right-aligned')
+_SCREENSHOT_LAYOUTS = ('grid', 'carousel', 'masonry')
+_FONT_FAMILIES = (
+    '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Oxygen, Ubuntu, sans-serif',
+    '"SF Pro Display", -apple-system, BlinkMacSystemFont, sans-serif',
+    'Inter, -apple-system, BlinkMacSystemFont, sans-serif',
+    '"Google Sans", Roboto, Arial, sans-serif'
+)
+_HEADING_WEIGHTS = ('600', '700', '800', '900')
+_BUTTON_RADII = ('50px', '15px', '25px', '10px')
+_STATS_STYLES = ('inline', 'cards', 'badges')
+_BUTTON_STYLES = ('solid', 'gradient', 'outline')
+_DESCRIPTION_STYLES = ('card', 'transparent', 'bordered')
+_SECTIONS = ('description', 'video', 'screenshots')
+
+# Тематические палитры считаются один раз в Python: в шаблоне остаются
+# плоские подстановки {{ theme.* }} вместо ~20 веток по dark_mode
+_DARK_THEME = {
+    'text': '#e0e0e0',
+    'page_bg': '#121212',
+    'card_bg': '#1e1e1e',
+    'muted': '#999',
+    'faint': '#aaa',
+    'border': '#333',
+    'label': '#888',
+    'text_strong': '#ddd',
+    'text_soft': '#ccc',
+    'heading_soft': '#ccc',
+    'panel_bg': '#2a2a2a',
+    'footer_bg': '#0a0a0a',
+    'footer_text': '#ccc',
+    'footer_link': '#aaa',
+    'footer_muted': '#777',
+}
+_LIGHT_THEME = {
+    'text': '#333',
+    'page_bg': '#f5f7fa',
+    'card_bg': 'white',
+    'muted': '#666',
+    'faint': '#999',
+    'border': '#eee',
+    'label': '#666',
+    'text_strong': '#333',
+    'text_soft': '#555',
+    'heading_soft': '#333',
+    'panel_bg': '#f8f9fa',
+    'footer_bg': '#2c3e50',
+    'footer_text': 'white',
+    'footer_link': '#ecf0f1',
+    'footer_muted': '#95a5a6',
+}
+
+_RNG = np.random.default_rng()
 
 def generate_randomization_params():
     """Генерация параметров для рандомизации дизайна"""
     try:
+        # Три батч-вызова генератора вместо ~20 обращений к random.*
+        u = _RNG.random(5)
+        ints = _RNG.integers((20, 30, 10, 90), (41, 51, 26, 181))
+        idx = _RNG.integers(0, (5, 3, 3, 4, 4, 4, 3, 3, 3))
+
         params = {
-            'layout_style': random.choice(['classic', 'modern', 'minimal', 'bold', 'elegant']),
-            'hero_layout': random.choice(['left-aligned', 'center-aligned', 'right-aligned']),
-            'screenshot_layout': random.choice(['grid', 'carousel', 'masonry']),
-            'font_family': random.choice([
-                '-apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Oxygen, Ubuntu, sans-serif',
-                '"SF Pro Display", -apple-system, BlinkMacSystemFont, sans-serif',
-                'Inter, -apple-system, BlinkMacSystemFont, sans-serif',
-                '"Google Sans", Roboto, Arial, sans-serif'
-            ]),
-            'heading_weight': random.choice(['600', '700', '800', '900']),
-            'title_size': random.uniform(2.2, 3.0),
-            'container_padding': random.randint(20, 40),
-            'section_spacing': random.randint(30, 50),
-            'border_radius': random.randint(10, 25),
-            'button_radius': random.choice(['50px', '15px', '25px', '10px']),
-            'shadow_intensity': random.uniform(0.05, 0.2),
-            'gradient_angle': random.randint(90, 180),
-            'animation_speed': random.uniform(0.2, 0.5),
-            'use_gradient_bg': random.choice([True, False]),
-            'dark_mode': random.choice([False, False, False, True]),
-            'stats_style': random.choice(['inline', 'cards', 'badges']),
-            'button_style': random.choice(['solid', 'gradient', 'outline']),
-            'description_style': random.choice(['card', 'transparent', 'bordered']),
-            'sections_order': random.sample(['description', 'video', 'screenshots'], 3)
+            'layout_style': _LAYOUT_STYLES[idx[0]],
+            'hero_layout': _HERO_LAYOUTS[idx[1]],
+            'screenshot_layout': _SCREENSHOT_LAYOUTS[idx[2]],
+            'font_family': _FONT_FAMILIES[idx[3]],
+            'heading_weight': _HEADING_WEIGHTS[idx[4]],
+            'title_size': float(2.2 + 0.8 * u[0]),
+            'container_padding': int(ints[0]),
+            'section_spacing': int(ints[1]),
+            'border_radius': int(ints[2]),
+            'button_radius': _BUTTON_RADII[idx[5]],
+            'shadow_intensity': float(0.05 + 0.15 * u[1]),
+            'gradient_angle': int(ints[3]),
+            'animation_speed': float(0.2 + 0.3 * u[2]),
+            'use_gradient_bg': bool(u[3] < 0.5),
+            'dark_mode': bool(u[4] < 0.25),
+            'theme': _DARK_THEME if u[4] < 0.25 else _LIGHT_THEME,
+            'stats_style': _STATS_STYLES[idx[6]],
+            'button_style': _BUTTON_STYLES[idx[7]],
+            'description_style': _DESCRIPTION_STYLES[idx[8]],
+            'sections_order': [_SECTIONS[i] for i in _RNG.permutation(3)]
         }
         return params
     except Exception as e:
@@ -263,6 +607,7 @@ def generate_randomization_params():
             'animation_speed': 0.3,
             'use_gradient_bg': False,
             'dark_mode': False,
+            'theme': _LIGHT_THEME,
             'stats_style': 'inline',
             'button_style': 'gradient',
             'description_style': 'card',
@@ -272,13 +617,17 @@ def generate_randomization_params():
 def process_app_data(package_name, language):
     """Получение и обработка данных приложения из Google Play"""
     try:
+        # Готовый результат (метаданные + имена локальных файлов) кэшируется
+        # целиком; кэшируем только успех, чтобы не закрепить "App not found"
+        data_key = f"app-data:{package_name}:{language}"
+        cached_data = cache.get(data_key)
+        if cached_data:
+            logger.info(f"Using cached app data for {package_name}/{language}")
+            return cached_data
+
         logger.info(f"Fetching app data for {package_name} in {language}")
-        
-        app_data = play_scraper(
-            package_name,
-            lang=language,
-            country='us'
-        )
+
+        app_data = cached_play_app(package_name, language)
         
         if not app_data:
             logger.error(f"No data received from Google Play for {package_name}")
@@ -290,7 +639,7 @@ def process_app_data(package_name, language):
         # Получаем ПОЛНОЕ описание
         full_description = app_data.get('descriptionHTML', '') or app_data.get('description', '')
         # Очищаем HTML теги если есть
-        full_description = re.sub('<.*?>', '', full_description)
+        full_description = strip_html(full_description)
         
         # Получаем краткое описание (summary)
         summary = app_data.get('summary', '')
@@ -330,46 +679,75 @@ def process_app_data(package_name, language):
             'in_app_purchases': app_data.get('offersIAP', False)
         }
         
-        # Скачиваем иконку
+        # Один scandir вместо stat на каждый файл: уже слинкованные картинки
+        # не уходят в пул вообще
+        existing_files = {entry.name for entry in os.scandir(app_images_dir)}
+
+        # Скачиваем иконку, обложку и скриншоты параллельно
+        download_tasks = []
         if app_data.get('icon'):
-            icon_path = os.path.join(app_images_dir, 'icon.png')
-            if download_image(app_data['icon'], icon_path):
-                processed_data['icon'] = 'icon.png'
-                processed_data['colors'] = extract_dominant_colors(icon_path)
-        
-        # Скачиваем обложку
+            download_tasks.append(('icon', 'icon.png', app_data['icon']))
         if app_data.get('headerImage'):
-            cover_path = os.path.join(app_images_dir, 'cover.jpg')
-            if download_image(app_data['headerImage'], cover_path):
-                processed_data['cover'] = 'cover.jpg'
-        
-        # Скачиваем скриншоты (все доступные)
+            download_tasks.append(('cover', 'cover.jpg', app_data['headerImage']))
+        for i, screenshot_url in enumerate(app_data.get('screenshots') or []):
+            download_tasks.append(('screenshot', f'screenshot_{i}.jpg', screenshot_url))
+
+        # Поиск похожих приложений не зависит от картинок — запускаем его
+        # параллельно со скачиванием, а результат забираем позже
+        similar_future = DOWNLOAD_POOL.submit(
+            get_similar_apps,
+            package_name,
+            app_data.get('developer'),
+            app_data.get('genreId'),
+            max_apps=8
+        )
+
+        pending_tasks = [t for t in download_tasks if t[1] not in existing_files]
+        pending_results = dict(zip(
+            (t[1] for t in pending_tasks),
+            DOWNLOAD_POOL.map(
+                lambda task: download_image(task[2], os.path.join(app_images_dir, task[1])),
+                pending_tasks
+            )
+        ))
+
         screenshots = []
-        if app_data.get('screenshots'):
-            for i, screenshot_url in enumerate(app_data['screenshots']):
-                screenshot_path = os.path.join(app_images_dir, f'screenshot_{i}.jpg')
-                if download_image(screenshot_url, screenshot_path):
-                    screenshots.append(f'screenshot_{i}.jpg')
+        for kind, filename, url in download_tasks:
+            if not pending_results.get(filename, True):
+                continue
+            if kind == 'icon':
+                processed_data['icon'] = filename
+                processed_data['colors'] = extract_dominant_colors(
+                    os.path.join(app_images_dir, filename), source_url=url)
+            elif kind == 'cover':
+                processed_data['cover'] = filename
+            else:
+                screenshots.append(filename)
         processed_data['screenshots'] = screenshots
         
         # Обрабатываем видео
         if app_data.get('video'):
             processed_data['video'] = get_youtube_embed_url(app_data['video'])
         
-        # Получаем похожие приложения
-        similar_apps = get_similar_apps(
-            package_name, 
-            app_data.get('developer'), 
-            app_data.get('genreId'),
-            max_apps=8
-        )
-        
-        # Скачиваем иконки похожих приложений
-        for i, similar_app in enumerate(similar_apps):
-            if similar_app.get('icon'):
-                similar_icon_path = os.path.join(app_images_dir, f'similar_{i}.png')
-                if download_image(similar_app['icon'], similar_icon_path):
-                    similar_app['icon_local'] = f'similar_{i}.png'
+        # Похожие приложения искались параллельно с картинками
+        similar_apps = similar_future.result()
+
+        # Скачиваем иконки похожих приложений параллельно
+        similar_tasks = [
+            (i, similar_app) for i, similar_app in enumerate(similar_apps)
+            if similar_app.get('icon')
+        ]
+        similar_pending = [t for t in similar_tasks if f'similar_{t[0]}.png' not in existing_files]
+        similar_results = dict(zip(
+            (t[0] for t in similar_pending),
+            DOWNLOAD_POOL.map(
+                lambda task: download_image(task[1]['icon'], os.path.join(app_images_dir, f'similar_{task[0]}.png')),
+                similar_pending
+            )
+        ))
+        for i, similar_app in similar_tasks:
+            if similar_results.get(i, True):
+                similar_app['icon_local'] = f'similar_{i}.png'
         
         processed_data['similar_apps'] = similar_apps
         
@@ -387,31 +765,17 @@ def process_app_data(package_name, language):
         
         logger.info(f"Successfully processed app data for {package_name}")
         logger.info(f"Description length: {len(full_description)} characters")
+
+        cache.set(data_key, processed_data, timeout=3600)
+
         return processed_data
         
     except Exception as e:
-        logger.error(f"Failed to process app data: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Failed to process app data")
         return None
-def generate_html(app_data, landing_id):
-    """Генерация HTML страницы лендинга с улучшенным контентом"""
-    try:
-        r = generate_randomization_params()
-        template_data = {**app_data, **r, 'landing_id': landing_id}
-        
-        # Обновляем пути к изображениям
-        if template_data.get('icon'):
-            template_data['icon'] = f"/landing/{landing_id}/{template_data['icon']}"
-        if template_data.get('cover'):
-            template_data['cover'] = f"/landing/{landing_id}/{template_data['cover']}"
-        if template_data.get('screenshots'):
-            template_data['screenshots'] = [f"/landing/{landing_id}/{s}" for s in template_data['screenshots']]
-        
-        # Обновляем пути для похожих приложений
-        for similar_app in template_data.get('similar_apps', []):
-            if similar_app.get('icon_local'):
-                similar_app['icon_local'] = f"/landing/{landing_id}/{similar_app['icon_local']}"
-        
-        template = Template('''<!DOCTYPE html>
+# Шаблон лендинга: парсится и компилируется один раз при импорте,
+# байткод кэшируется на диске и переживает перезапуск воркеров
+LANDING_TEMPLATE_SRC = '''<!DOCTYPE html>
 <html lang="{{ language }}">
 <head>
     <meta charset="UTF-8">
@@ -437,13 +801,13 @@ def generate_html(app_data, landing_id):
         body {
             font-family: {{ font_family }};
             line-height: 1.6;
-            color: {% if dark_mode %}#e0e0e0{% else %}#333{% endif %};
+            color: {{ theme.text }};
             {% if use_gradient_bg %}
             background: linear-gradient({{ gradient_angle }}deg, 
                 {{ colors[0] }}22 0%, 
                 {{ colors[1] }}22 100%);
             {% else %}
-            background: {% if dark_mode %}#121212{% else %}#f5f7fa{% endif %};
+            background: {{ theme.page_bg }};
             {% endif %}
             min-height: 100vh;
         }
@@ -455,7 +819,7 @@ def generate_html(app_data, landing_id):
         }
         
         .hero {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             border-radius: var(--border-radius);
             padding: {{ section_spacing }}px;
             margin-bottom: var(--section-spacing);
@@ -502,7 +866,7 @@ def generate_html(app_data, landing_id):
         }
         
         .developer {
-            color: {% if dark_mode %}#999{% else %}#666{% endif %};
+            color: {{ theme.muted }};
             font-size: 1.1em;
             margin-bottom: 15px;
         }
@@ -547,7 +911,7 @@ def generate_html(app_data, landing_id):
         {% endif %}
         
         .stat-label {
-            color: {% if dark_mode %}#aaa{% else %}#999{% endif %};
+            color: {{ theme.faint }};
             font-size: 0.9em;
         }
         
@@ -563,7 +927,7 @@ def generate_html(app_data, landing_id):
             flex-wrap: wrap;
             margin-top: 20px;
             padding-top: 20px;
-            border-top: 1px solid {% if dark_mode %}#333{% else %}#eee{% endif %};
+            border-top: 1px solid {{ theme.border }};
         }
         
         .meta-item {
@@ -574,12 +938,12 @@ def generate_html(app_data, landing_id):
         
         .meta-label {
             font-size: 0.85em;
-            color: {% if dark_mode %}#888{% else %}#666{% endif %};
+            color: {{ theme.label }};
         }
         
         .meta-value {
             font-weight: 600;
-            color: {% if dark_mode %}#ddd{% else %}#333{% endif %};
+            color: {{ theme.text_strong }};
         }
         
         {% if button_style == 'gradient' %}
@@ -636,7 +1000,7 @@ def generate_html(app_data, landing_id):
         }
         
         .description {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             padding: 30px;
             border-radius: var(--border-radius);
             margin-bottom: var(--section-spacing);
@@ -650,7 +1014,7 @@ def generate_html(app_data, landing_id):
         }
         
         .description-text {
-            color: {% if dark_mode %}#ccc{% else %}#555{% endif %};
+            color: {{ theme.text_soft }};
             line-height: 1.8;
             white-space: pre-wrap;
         }
@@ -672,7 +1036,7 @@ def generate_html(app_data, landing_id):
         }
         
         .video-section {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             padding: 30px;
             border-radius: var(--border-radius);
             margin-bottom: var(--section-spacing);
@@ -703,7 +1067,7 @@ def generate_html(app_data, landing_id):
         }
         
         .screenshots {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             padding: 30px;
             border-radius: var(--border-radius);
             box-shadow: 0 10px 30px rgba(0,0,0,calc(var(--shadow-intensity)));
@@ -767,7 +1131,7 @@ def generate_html(app_data, landing_id):
         }
         
         .similar-apps {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             padding: 30px;
             border-radius: var(--border-radius);
             margin-bottom: var(--section-spacing);
@@ -805,7 +1169,7 @@ def generate_html(app_data, landing_id):
         
         .similar-app-title {
             font-size: 0.9em;
-            color: {% if dark_mode %}#ccc{% else %}#333{% endif %};
+            color: {{ theme.heading_soft }};
             margin-bottom: 5px;
             overflow: hidden;
             text-overflow: ellipsis;
@@ -816,11 +1180,11 @@ def generate_html(app_data, landing_id):
         
         .similar-app-rating {
             font-size: 0.8em;
-            color: {% if dark_mode %}#888{% else %}#666{% endif %};
+            color: {{ theme.label }};
         }
         
         .additional-info {
-            background: {% if dark_mode %}#1e1e1e{% else %}white{% endif %};
+            background: {{ theme.card_bg }};
             padding: 30px;
             border-radius: var(--border-radius);
             margin-bottom: var(--section-spacing);
@@ -841,19 +1205,19 @@ def generate_html(app_data, landing_id):
         
         .info-item {
             padding: 15px;
-            background: {% if dark_mode %}#2a2a2a{% else %}#f8f9fa{% endif %};
+            background: {{ theme.panel_bg }};
             border-radius: 10px;
         }
         
         .info-item-label {
             font-size: 0.9em;
-            color: {% if dark_mode %}#888{% else %}#666{% endif %};
+            color: {{ theme.label }};
             margin-bottom: 5px;
         }
         
         .info-item-value {
             font-weight: 600;
-            color: {% if dark_mode %}#ddd{% else %}#333{% endif %};
+            color: {{ theme.text_strong }};
         }
         
         .badges {
@@ -878,8 +1242,8 @@ def generate_html(app_data, landing_id):
         }
         
         footer {
-            background: {% if dark_mode %}#0a0a0a{% else %}#2c3e50{% endif %};
-            color: {% if dark_mode %}#ccc{% else %}white{% endif %};
+            background: {{ theme.footer_bg }};
+            color: {{ theme.footer_text }};
             padding: 40px 0;
             margin-top: 60px;
         }
@@ -896,7 +1260,7 @@ def generate_html(app_data, landing_id):
         }
         
         .footer-links a {
-            color: {% if dark_mode %}#aaa{% else %}#ecf0f1{% endif %};
+            color: {{ theme.footer_link }};
             text-decoration: none;
             margin: 0 15px;
             transition: color 0.3s;
@@ -907,7 +1271,7 @@ def generate_html(app_data, landing_id):
         }
         
         .footer-copyright {
-            color: {% if dark_mode %}#777{% else %}#95a5a6{% endif %};
+            color: {{ theme.footer_muted }};
             font-size: 0.9em;
             margin-top: 20px;
         }
@@ -1033,8 +1397,8 @@ def generate_html(app_data, landing_id):
                 </div>
                 {% endif %}
                 <div class="description-text">
-                    <span class="description-short">{{ description[:500] }}{% if description|length > 500 %}...{% endif %}</span>
-                    {% if description|length > 500 %}
+                    <span class="description-short">{{ description_short }}</span>
+                    {% if description_is_long %}
                     <span class="description-full">{{ description }}</span>
                     <a href="#" class="read-more-btn" onclick="toggleDescription(event)">Read more</a>
                     {% endif %}
@@ -1124,7 +1488,7 @@ def generate_html(app_data, landing_id):
             {% if recent_changes %}
             <div style="margin-top: 30px;">
                 <h3 style="color: var(--primary-color); margin-bottom: 15px;">What's New</h3>
-                <div style="white-space: pre-wrap; color: {% if dark_mode %}#ccc{% else %}#555{% endif %};">{{ recent_changes }}</div>
+                <div style="white-space: pre-wrap; color: {{ theme.text_soft }};">{{ recent_changes }}</div>
             </div>
             {% endif %}
         </div>
@@ -1188,23 +1552,54 @@ def generate_html(app_data, landing_id):
     }
     </script>
 </body>
-</html>''')
+</html>'''
+
+_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', '/tmp/jinja_bcc')
+os.makedirs(_BYTECODE_CACHE_DIR, exist_ok=True)
+JINJA_ENV = Environment(
+    loader=DictLoader({'landing.html': LANDING_TEMPLATE_SRC}),
+    auto_reload=False,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(_BYTECODE_CACHE_DIR)
+)
+LANDING_TEMPLATE = JINJA_ENV.get_template('landing.html')
+
+def generate_html(app_data, landing_id):
+    """Генерация HTML страницы лендинга с улучшенным контентом"""
+    try:
+        r = generate_randomization_params()
+        template_data = {**app_data, **r, 'landing_id': landing_id}
+
+        # Усечённое описание считается здесь — шаблону не нужно гонять
+        # полный текст через слайсы и |length
+        description = template_data.get('description') or ''
+        template_data['description_is_long'] = len(description) > 500
+        template_data['description_short'] = (
+            description[:500] + '...' if template_data['description_is_long'] else description
+        )
+        
+        # Обновляем пути к изображениям
+        if template_data.get('icon'):
+            template_data['icon'] = f"/landing/{landing_id}/{template_data['icon']}"
+        if template_data.get('cover'):
+            template_data['cover'] = f"/landing/{landing_id}/{template_data['cover']}"
+        if template_data.get('screenshots'):
+            template_data['screenshots'] = [f"/landing/{landing_id}/{s}" for s in template_data['screenshots']]
+        
+        # Обновляем пути для похожих приложений
+        for similar_app in template_data.get('similar_apps', []):
+            if similar_app.get('icon_local'):
+                similar_app['icon_local'] = f"/landing/{landing_id}/{similar_app['icon_local']}"
         
-        return template.render(**template_data)
+
+        return LANDING_TEMPLATE.render(**template_data)
     except Exception as e:
-        logger.error(f"Error generating HTML: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Error generating HTML")
         raise
 
-def generate_privacy_policy(app_title):
-    """Генерация политики конфиденциальности с JS для динамического домена"""
-    return f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Privacy Policy - {app_title}</title>
-    <style>
-        body {{
+# Общий CSS правовых страниц: один файл на лендинг вместо инлайна в
+# каждом документе — браузер кэширует, шаблоны короче
+LEGAL_CSS = """        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
             line-height: 1.6;
             color: #333;
@@ -1212,36 +1607,46 @@ def generate_privacy_policy(app_title):
             margin: 0 auto;
             padding: 40px 20px;
             background: #f5f5f5;
-        }}
-        .container {{
+        }
+        .container {
             background: white;
             padding: 40px;
             border-radius: 10px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
+        }
+        h1 {
             color: #2c3e50;
             border-bottom: 3px solid #3498db;
             padding-bottom: 10px;
-        }}
-        h2 {{
+        }
+        h2 {
             color: #34495e;
             margin-top: 30px;
-        }}
-        .date {{
+        }
+        .date {
             color: #7f8c8d;
             font-style: italic;
-        }}
-        a {{
+        }
+        a {
             color: #3498db;
             text-decoration: none;
-        }}
-    </style>
+        }
+    """
+
+# Политика конфиденциальности: постоянный шаблон собирается один раз при
+# импорте, на запрос остаётся одна подстановка format_map
+PRIVACY_TEMPLATE_SRC = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Privacy Policy - {app_title}</title>
+    <link rel="stylesheet" href="legal.css">
 </head>
 <body>
     <div class="container">
         <h1>Privacy Policy</h1>
-        <p class="date">Last updated: {datetime.now().strftime('%B %d, %Y')}</p>
+        <p class="date">Last updated: {date}</p>
         
         <h2>Introduction</h2>
         <p>Welcome to {app_title}. This Privacy Policy explains how we collect, use, disclose, and safeguard your information when you use our mobile application.</p>
@@ -1306,45 +1711,45 @@ def generate_privacy_policy(app_title):
 </body>
 </html>'''
 
-def generate_terms_of_service(app_title):
-    """Генерация пользовательского соглашения с JS для динамического домена"""
-    return f'''<!DOCTYPE html>
+# Отформатированная дата одинакова для всех рендеров в пределах суток —
+# strftime с локалью дергается один раз в день, дальше сравнение ординала
+_DATE_CACHE = {'day': None, 'str': None}
+
+def _today_str():
+    day = datetime.now().toordinal()
+    if day != _DATE_CACHE['day']:
+        _DATE_CACHE['str'] = datetime.now().strftime('%B %d, %Y')
+        _DATE_CACHE['day'] = day
+    return _DATE_CACHE['str']
+
+@lru_cache(maxsize=512)
+def _render_privacy_policy(app_title, date_str):
+    return PRIVACY_TEMPLATE_SRC.format_map({
+        'app_title': html.escape(app_title),
+        'date': date_str
+    })
+
+def generate_privacy_policy(app_title):
+    """Генерация политики конфиденциальности с JS для динамического домена.
+
+    Результат детерминирован по (app_title, дата) — повторные генерации
+    того же приложения в течение дня берут готовую строку из LRU."""
+    return _render_privacy_policy(app_title, _today_str())
+
+# Пользовательское соглашение: тот же приём, что и у политики —
+# постоянный шаблон + одна подстановка format_map на рендер
+TERMS_TEMPLATE_SRC = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Terms of Service - {app_title}</title>
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 40px 20px;
-            background: #f5f5f5;
-        }}
-        .container {{
-            background: white;
-            padding: 40px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
-            color: #2c3e50;
-            border-bottom: 3px solid #3498db;
-            padding-bottom: 10px;
-        }}
-        h2 {{
-            color: #34495e;
-            margin-top: 30px;
-        }}
-    </style>
+    <link rel="stylesheet" href="legal.css">
 </head>
 <body>
     <div class="container">
         <h1>Terms of Service</h1>
-        <p>Effective Date: {datetime.now().strftime('%B %d, %Y')}</p>
+        <p>Effective Date: {date}</p>
         
         <h2>1. Agreement to Terms</h2>
         <p>By accessing and using {app_title}, you agree to be bound by these Terms of Service and all applicable laws and regulations.</p>
@@ -1412,23 +1817,77 @@ def generate_terms_of_service(app_title):
 </body>
 </html>'''
 
+@lru_cache(maxsize=512)
+def _render_terms_of_service(app_title, date_str):
+    return TERMS_TEMPLATE_SRC.format_map({
+        'app_title': html.escape(app_title),
+        'date': date_str
+    })
+
+def generate_terms_of_service(app_title):
+    """Генерация пользовательского соглашения с JS для динамического домена.
+
+    Кэшируется так же, как политика: ключ — (app_title, дата)."""
+    return _render_terms_of_service(app_title, _today_str())
+
+# Прогрев LRU правовых страниц для известных заранее приложений:
+# WARM_LEGAL_TITLES="App One,App Two" — первый лендинг дня не платит за рендер
+for _title in filter(None, (t.strip() for t in os.environ.get('WARM_LEGAL_TITLES', '').split(','))):
+    generate_privacy_policy(_title)
+    generate_terms_of_service(_title)
+
 def create_landing_archive(landing_dir, landing_id):
     """Создание ZIP архива с лендингом и всеми ресурсами"""
     try:
         archive_path = os.path.join(ARCHIVES_DIR, f"{landing_id}.zip")
         
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # JPEG/PNG уже энтропийно сжаты — deflate для них бесполезен, жмём только текст
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as zipf:
             for root, dirs, files in os.walk(landing_dir):
                 for file in files:
+                    # Служебные прекомпрессированные/временные файлы в архив не идут
+                    if file.endswith(('.gz', '.tmp', '.part')):
+                        continue
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, landing_dir)
-                    zipf.write(file_path, arcname)
+                    if file.endswith(('.html', '.css', '.js', '.txt', '.json')):
+                        zipf.write(file_path, arcname, compress_type=zipfile.ZIP_DEFLATED)
+                    else:
+                        zipf.write(file_path, arcname)
         
         logger.info(f"Archive created: {archive_path}")
         return archive_path
     except Exception as e:
         logger.error(f"Failed to create archive: {str(e)}")
         return None
+
+# Отдельный пул для фоновой доводки лендинга — архивация не блокирует HTTP-ответ
+FINALIZE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='finalize')
+
+def finalize_landing(landing_dir, landing_id, app_title, html_content):
+    """Фоновая доводка лендинга: запись HTML, правовые документы и ZIP-архив
+    вне пути запроса"""
+    try:
+        # index.html пишется первым — лендинг доступен до сборки архива
+        atomic_write(os.path.join(landing_dir, 'index.html'), html_content)
+
+        # Прекомпрессия один раз на запись — отдача gzip без CPU на каждый GET
+        atomic_write(os.path.join(landing_dir, 'index.html.gz'),
+                     gzip.compress(html_content.encode('utf-8'), compresslevel=6))
+
+        atomic_write(os.path.join(landing_dir, 'legal.css'), LEGAL_CSS)
+        # Правовые страницы прекомпрессируются так же, как index.html;
+        # кодируем один раз и дальше работаем с байтами
+        for name, content in (('privacy.html', generate_privacy_policy(app_title)),
+                              ('terms.html', generate_terms_of_service(app_title))):
+            raw = content.encode('utf-8')
+            atomic_write(os.path.join(landing_dir, name), raw)
+            atomic_write(os.path.join(landing_dir, name + '.gz'),
+                         gzip.compress(raw, compresslevel=6))
+
+        create_landing_archive(landing_dir, landing_id)
+    except Exception as e:
+        logger.error(f"Failed to finalize landing {landing_id}: {e}")
 # [Здесь идут функции generate_html, generate_privacy_policy, generate_terms_of_service, create_landing_archive - они остаются без изменений]
 
 @app.route('/', methods=['GET'])
@@ -1490,9 +1949,22 @@ def generate_landing():
         
         package_name = data['packageName']
         language = data.get('language', 'en')
-        
+
+        if not _PKG_RE.match(package_name):
+            error_msg = f"Invalid packageName: {package_name}"
+            logger.error(error_msg)
+            return jsonify({'error': 'Invalid packageName'}), 400
+
         logger.info(f"Processing request for {package_name} in {language}")
-        
+
+        # Короткое замыкание: лендинг для этой пары уже генерировался сегодня —
+        # отдаём готовый результат без скрейпинга, скачивания и рендера
+        result_key = f"landing-result:{package_name}:{language}:{datetime.now().strftime('%Y%m%d')}"
+        cached_result = cache.get(result_key)
+        if cached_result and os.path.exists(os.path.join(LANDINGS_DIR, cached_result['landing_id'], 'index.html')):
+            logger.info(f"Returning cached landing for {package_name}/{language}")
+            return jsonify(cached_result), 200
+
         # Получаем и обрабатываем данные приложения
         app_data = process_app_data(package_name, language)
         
@@ -1508,43 +1980,27 @@ def generate_landing():
         landing_dir = os.path.join(LANDINGS_DIR, landing_id)
         os.makedirs(landing_dir, exist_ok=True)
         
-        # Копируем изображения в директорию лендинга
+        # Ссылаем изображения в директорию лендинга вместо копирования
         source_images_dir = os.path.join(IMAGES_DIR, package_name)
         if os.path.exists(source_images_dir):
-            for filename in os.listdir(source_images_dir):
-                src = os.path.join(source_images_dir, filename)
-                dst = os.path.join(landing_dir, filename)
-                if os.path.isfile(src):
-                    shutil.copy2(src, dst)
-                    logger.info(f"Copied image {filename} to landing directory")
+            # scandir отдаёт тип файла сразу, без отдельного stat на каждый элемент
+            with os.scandir(source_images_dir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        link_image(entry.path, os.path.join(landing_dir, entry.name))
         
         # Генерируем HTML
         html_content = generate_html(app_data, landing_id)
         
-        # Сохраняем HTML файл
-        landing_html_path = os.path.join(landing_dir, 'index.html')
-        with open(landing_html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # Генерируем правовые документы
-        privacy_content = generate_privacy_policy(app_data['title'])
-        terms_content = generate_terms_of_service(app_data['title'])
-        
-        with open(os.path.join(landing_dir, 'privacy.html'), 'w', encoding='utf-8') as f:
-            f.write(privacy_content)
-        
-        with open(os.path.join(landing_dir, 'terms.html'), 'w', encoding='utf-8') as f:
-            f.write(terms_content)
-        
-        # Создаем ZIP архив
-        archive_path = create_landing_archive(landing_dir, landing_id)
-        
+        # Запись файлов и ZIP-архив уходят в фон — ответ не ждёт диск и компрессию
+        FINALIZE_POOL.submit(finalize_landing, landing_dir, landing_id, app_data['title'], html_content)
+
         logger.info(f"Landing generated successfully: {landing_id}")
-        
-        # Формируем URLs
+
+        # Формируем URLs (путь архива предсказуем, файл появится чуть позже)
         landing_url = f"{BASE_URL}/landing/{landing_id}/"
-        archive_url = f"{BASE_URL}/download/{landing_id}.zip" if archive_path else None
-        
+        archive_url = f"{BASE_URL}/download/{landing_id}.zip"
+
         # Возвращаем ссылки
         response_data = {
             'success': True,
@@ -1552,28 +2008,51 @@ def generate_landing():
             'landing_id': landing_id,
             'package_name': package_name,
             'language': language,
-            'app_title': app_data.get('title', 'Unknown App')
+            'app_title': app_data.get('title', 'Unknown App'),
+            'archive_url': archive_url
         }
-        
-        if archive_url:
-            response_data['archive_url'] = archive_url
-        
+
+        cache.set(result_key, response_data, timeout=86400)
+
         return jsonify(response_data), 200
         
     except Exception as e:
-        logger.error(f"Internal error: {str(e)}\n{traceback.format_exc()}")
+        logger.exception("Internal error")
         return jsonify({
             'error': 'An internal error occurred',
             'details': str(e)
         }), 500
 
+def serve_cached(directory, filename, max_age, immutable=False):
+    """Отдача файла с HTTP-кэшированием: ETag + Cache-Control + условные ответы"""
+    response = send_from_directory(directory, filename, conditional=True)
+    cache_control = f'public, max-age={max_age}'
+    if immutable:
+        cache_control += ', immutable'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
 @app.route('/landing/<landing_id>/')
 @app.route('/landing/<landing_id>/index.html')
 def serve_landing(landing_id):
     """Отдача готового лендинга"""
     try:
         landing_dir = os.path.join(LANDINGS_DIR, landing_id)
-        return send_from_directory(landing_dir, 'index.html')
+        if not os.path.exists(os.path.join(landing_dir, 'index.html')) and os.path.isdir(landing_dir):
+            # HTML ещё дописывается в фоне — просим клиента повторить
+            response = make_response('<meta http-equiv="refresh" content="1">', 202)
+            response.headers['Retry-After'] = '1'
+            return response
+
+        # Прекомпрессированный вариант, если клиент понимает gzip
+        if 'gzip' in request.accept_encodings and os.path.exists(os.path.join(landing_dir, 'index.html.gz')):
+            response = serve_cached(landing_dir, 'index.html.gz', max_age=300)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Content-Type'] = 'text/html; charset=utf-8'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        return serve_cached(landing_dir, 'index.html', max_age=300)
     except Exception as e:
         logger.error(f"Error serving landing: {e}")
         abort(404)
@@ -1582,8 +2061,19 @@ def serve_landing(landing_id):
 def serve_landing_resource(landing_id, filename):
     """Отдача ресурсов лендинга"""
     try:
+        # Ресурсы лендинга неизменяемы в рамках landing_id — кэшируем надолго
         landing_dir = os.path.join(LANDINGS_DIR, landing_id)
-        return send_from_directory(landing_dir, filename)
+
+        # Для HTML (privacy/terms) отдаём прекомпрессированный вариант
+        if (filename.endswith('.html') and 'gzip' in request.accept_encodings
+                and os.path.exists(os.path.join(landing_dir, filename + '.gz'))):
+            response = serve_cached(landing_dir, filename + '.gz', max_age=31536000, immutable=True)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Content-Type'] = 'text/html; charset=utf-8'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+        return serve_cached(landing_dir, filename, max_age=31536000, immutable=True)
     except Exception as e:
         logger.error(f"Error serving resource: {e}")
         abort(404)
@@ -1592,7 +2082,16 @@ def serve_landing_resource(landing_id, filename):
 def download_archive(filename):
     """Скачивание ZIP архива"""
     try:
-        return send_from_directory(ARCHIVES_DIR, filename)
+        archive_path = os.path.join(ARCHIVES_DIR, filename)
+        if not os.path.exists(archive_path):
+            landing_id = filename.rsplit('.', 1)[0]
+            if os.path.exists(os.path.join(LANDINGS_DIR, landing_id)):
+                # Архив ещё собирается в фоне
+                response = jsonify({'status': 'pending', 'landing_id': landing_id})
+                response.status_code = 202
+                response.headers['Retry-After'] = '5'
+                return response
+        return serve_cached(ARCHIVES_DIR, filename, max_age=31536000, immutable=True)
     except Exception as e:
         logger.error(f"Error downloading archive: {e}")
         abort(404)
@@ -1615,6 +2114,7 @@ for rule in app.url_map.iter_rules():
 
 if __name__ == '__main__':
     logger.info("Starting Flask application directly")
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    # Отладчик Werkzeug только по явному запросу — в проде работает gunicorn
+    app.run(host='0.0.0.0', port=8080, debug=os.environ.get('FLASK_DEBUG') == '1')
 else:
     logger.info("Flask app created for Gunicorn")